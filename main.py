@@ -2,13 +2,28 @@ from src.data_processing import load_malawi_contacts, split_into_days, daily_edg
 from src.analysis_h1 import run_h1
 from src.analysis_h2 import run_h2
 from src.analysis_h3 import run_h3
+from src.helpers import estimate_num_agents, load_or_build_sequence_bank
+from src.screening import report_tier_agreement
 from src.plots import plot_h1, plot_h2, plot_h3
 
+SEQUENCE_BANK_SEED = 2025
+SEQUENCE_BANK_PATH = f"results/sequence_bank_seed{SEQUENCE_BANK_SEED}.npy"
+
 def main():
     df = load_malawi_contacts("data/malawi_contacts.csv")
     days = split_into_days(df)
     edges = daily_edge_lists(days)
 
+    # One shared bank of bootstrapped contact sequences, sized for the
+    # largest experiment below and reused by every hypothesis
+    bank = load_or_build_sequence_bank(
+        SEQUENCE_BANK_PATH,
+        edges,
+        num_runs=300,
+        num_days=120,
+        seed=SEQUENCE_BANK_SEED,
+    )
+
     # H1 config & run
     mean_individual, mean_household, reduction_h1 = run_h1(
         edges,
@@ -18,6 +33,7 @@ def main():
         infectious_days=5,
         external_infection_prob=0.001,
         initial_infected=3,
+        sequence_bank=bank,
     )
 
     # H2 config & run
@@ -28,6 +44,8 @@ def main():
         mean_peak_I_low,
         delay_h2,
         reduction_peak_h2,
+        mean_attack_high_h2,
+        mean_attack_low_h2,
     ) = run_h2(
         edges,
         num_days=120,
@@ -38,6 +56,7 @@ def main():
         initial_infected=3,
         contact_reduction_low=0.4,
         min_attack=0.2,
+        sequence_bank=bank,
     )
 
     # H3 config & run
@@ -51,6 +70,26 @@ def main():
         initial_infected=3,
         vaccination_coverage=0.30,
         large_outbreak_thresh=0.5,
+        sequence_bank=bank,
+    )
+
+    # Screening tier vs full agent-based runs on the same configurations
+    num_agents = estimate_num_agents(edges)
+    h1 = dict(infection_prob=0.03, isolate_symptomatic=True)
+    h2 = dict(infection_prob=0.08)
+    h3 = dict(infection_prob=0.09)
+    report_tier_agreement(
+        edges,
+        [
+            ("H1 individual isolation", h1, "attack", mean_individual / num_agents),
+            # The screen treats household isolation like individual isolation
+            ("H1 household isolation", None, "attack", mean_household / num_agents),
+            ("H2 high contacts", h2, "attack", mean_attack_high_h2),
+            ("H2 low contacts", dict(h2, contact_reduction=0.4), "attack",
+             mean_attack_low_h2),
+            ("H3 no vaccination", h3, "p_large", p_no),
+            ("H3 30% vaccination", dict(h3, vaccination_coverage=0.30), "p_large", p_vax),
+        ],
     )
 
     #Plots
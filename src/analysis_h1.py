@@ -1,8 +1,14 @@
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import numpy as np
 from src.simulation import EpidemicSimulation
-from src.helpers import build_households, bootstrap_contact_sequence, estimate_num_agents
+from src.helpers import (
+    build_households,
+    household_index,
+    bootstrap_contact_sequence,
+    contact_sequence_from_bank,
+    estimate_num_agents,
+)
 
 def run_h1(
     daily_edges: Dict[int, List[Tuple[int, int]]],
@@ -12,6 +18,7 @@ def run_h1(
     infectious_days: int = 5,
     external_infection_prob: float = 0.001,
     initial_infected: int = 3,
+    sequence_bank: Optional[np.ndarray] = None,
 ):
     """Run Monte Carlo experiments for Hypothesis 1.
 
@@ -22,6 +29,8 @@ def run_h1(
     :param daily_edges : Mapping from day index to a list of (i, j) contact pairs between agents
     :param num_days : Number of synthetic days to simulate per run (default 120)
     :param num_runs : Number of Monte Carlo runs to average over (default 100)
+    :param sequence_bank : Optional int16 bank of day keys from build_sequence_bank; row r
+        is replayed for run r instead of drawing a fresh bootstrap sequence
 
     :returns mean_individual : Mean total infections when only symptomatic individuals are isolated.
     :returns mean_household : Mean total infections when symptomatic individuals and their households are isolated.
@@ -45,12 +54,16 @@ def run_h1(
     rng = random.Random(42)
     num_agents = estimate_num_agents(daily_edges)
     households = build_households(num_agents, household_size=4, rng=rng)
+    household_of = household_index(num_agents, households)
 
     final_individual = []
     final_household = []
     
-    for _ in range(num_runs):
-        seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
+    for run in range(num_runs):
+        if sequence_bank is not None:
+            seq = contact_sequence_from_bank(daily_edges, sequence_bank, run, num_days)
+        else:
+            seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
 
         # Scenario A: isolate symptomatic only
         simA = EpidemicSimulation(
@@ -59,7 +72,7 @@ def run_h1(
         infection_prob=infection_prob,
         infectious_days=infectious_days,
         rng=rng,
-        households=households,
+        household_of=household_of,
         isolate_symptomatic=True,
         isolate_households=False,
         vaccination_coverage=0.0,
@@ -76,7 +89,7 @@ def run_h1(
             infection_prob=0.03,
             infectious_days=5,
             rng=rng,
-            households=households,
+            household_of=household_of,
             isolate_symptomatic=True,
             isolate_households=True,
             vaccination_coverage=0.0,
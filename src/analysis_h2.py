@@ -1,9 +1,15 @@
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from src.simulation import EpidemicSimulation
-from src.helpers import build_households, bootstrap_contact_sequence, estimate_num_agents
+from src.helpers import (
+    build_households,
+    household_index,
+    bootstrap_contact_sequence,
+    contact_sequence_from_bank,
+    estimate_num_agents,
+)
 
 
 def run_h2(
@@ -16,7 +22,8 @@ def run_h2(
     initial_infected: int = 3,
     contact_reduction_low: float = 0.4,
     min_attack: float = 0.2,
-) -> Tuple[float, float, float, float, float, float]:
+    sequence_bank: Optional[np.ndarray] = None,
+) -> Tuple[float, float, float, float, float, float, float, float]:
     """Run Monte Carlo experiments for Hypothesis 2.
 
     H2 compares:
@@ -27,7 +34,8 @@ def run_h2(
       - mean day of the infection peak in each scenario, and
       - mean peak infectious count in each scenario,
       then computes the delay in peak timing and the relative reduction
-      in peak caseload.
+      in peak caseload. It also reports the mean attack rate of each
+      scenario over all runs, which the screening tier predicts.
       
     :param daily_edges : dict[int, list[tuple[int, int]]]
         Mapping from day index to a list of (i, j) contact pairs between agents.
@@ -35,6 +43,10 @@ def run_h2(
         Number of synthetic days to simulate per run (default 120).
     :param num_runs : int
         Number of Monte Carlo runs to average over (default 200).
+    :param sequence_bank : numpy.ndarray, optional
+        int16 bank of day keys from build_sequence_bank. Row r is replayed
+        for run r instead of drawing a fresh bootstrap sequence, so runs
+        line up across hypotheses (common random numbers).
 
     :return mean_peak_day_high : float
         Mean peak day in the high-contact scenario.
@@ -50,6 +62,10 @@ def run_h2(
     :return reduction_peak : float
         Relative reduction in peak caseload:
         1 - mean_peak_I_low / mean_peak_I_high
+    :return mean_attack_high : float
+        Mean final_R / num_agents over all runs in the high-contact scenario.
+    :return mean_attack_low : float
+        Mean final_R / num_agents over all runs in the low-contact scenario.
 
     >>> edges = {0: [(0, 1)]}  # both agents meet on day 0
     >>> result = run_h2(edges, num_days=5, num_runs=5)  # doctest: +ELLIPSIS
@@ -60,22 +76,29 @@ def run_h2(
       Mean peak I (high): ...
       Mean peak I (low): ...
       Relative reduction in peak load: ...
+      Mean attack rate (high / low): ...
     >>> len(result)
-    6
+    8
     >>> all(isinstance(x, float) for x in result)
     True
     """
     rng = random.Random(123)
     num_agents = estimate_num_agents(daily_edges)
     households = build_households(num_agents, household_size=4, rng=rng)
+    household_of = household_index(num_agents, households)
 
     peak_day_high: List[float] = []
     peak_I_high: List[float] = []
     peak_day_low: List[float] = []
     peak_I_low: List[float] = []
+    attacks_high: List[float] = []
+    attacks_low: List[float] = []
 
-    for _ in range(num_runs):
-        seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
+    for run in range(num_runs):
+        if sequence_bank is not None:
+            seq = contact_sequence_from_bank(daily_edges, sequence_bank, run, num_days)
+        else:
+            seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
 
         # --- High contacts (baseline) ---
         sim_high = EpidemicSimulation(
@@ -84,7 +107,7 @@ def run_h2(
             infection_prob=infection_prob,
             infectious_days=infectious_days,
             rng=rng,
-            households=households,
+            household_of=household_of,
             isolate_symptomatic=False,
             isolate_households=False,
             vaccination_coverage=0.0,
@@ -101,7 +124,7 @@ def run_h2(
             infection_prob=infection_prob,
             infectious_days=infectious_days,
             rng=rng,
-            households=households,
+            household_of=household_of,
             isolate_symptomatic=False,
             isolate_households=False,
             vaccination_coverage=0.0,
@@ -110,6 +133,8 @@ def run_h2(
         sim_low.seed_initial_infections(initial_infected)
         I_low, final_R_low = sim_low.run(contact_reduction=contact_reduction_low)
         attack_low = final_R_low / num_agents
+        attacks_high.append(attack_high)
+        attacks_low.append(attack_low)
 
         # Only keep runs where both scenarios had real outbreaks
         if attack_high >= min_attack and attack_low >= min_attack:
@@ -133,6 +158,8 @@ def run_h2(
 
     delay = mean_peak_day_low - mean_peak_day_high
     reduction_peak = 1 - (mean_peak_I_low / mean_peak_I_high)
+    mean_attack_high = float(np.mean(attacks_high))
+    mean_attack_low = float(np.mean(attacks_low))
 
     print("H2:")
     print("  Mean peak day (high contacts):", mean_peak_day_high)
@@ -141,6 +168,7 @@ def run_h2(
     print("  Mean peak I (high):", mean_peak_I_high)
     print("  Mean peak I (low):", mean_peak_I_low)
     print("  Relative reduction in peak load:", reduction_peak)
+    print("  Mean attack rate (high / low):", mean_attack_high, "/", mean_attack_low)
 
     return (
         mean_peak_day_high,
@@ -149,4 +177,6 @@ def run_h2(
         mean_peak_I_low,
         delay,
         reduction_peak,
+        mean_attack_high,
+        mean_attack_low,
     )
@@ -1,9 +1,15 @@
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from src.simulation import EpidemicSimulation
-from src.helpers import build_households, bootstrap_contact_sequence, estimate_num_agents
+from src.helpers import (
+    build_households,
+    household_index,
+    bootstrap_contact_sequence,
+    contact_sequence_from_bank,
+    estimate_num_agents,
+)
 
 
 def run_h3(
@@ -16,6 +22,7 @@ def run_h3(
     initial_infected: int = 3,
     vaccination_coverage: float = 0.30,
     large_outbreak_thresh: float = 0.5,
+    sequence_bank: Optional[np.ndarray] = None,
 ) -> Tuple[float, float, float]:
     """Run Monte Carlo experiments for Hypothesis 3.
 
@@ -36,6 +43,10 @@ def run_h3(
         Number of synthetic days to simulate per run (default 120).
     :param num_runs : int
         Number of Monte Carlo runs to average over (default 300).
+    :param sequence_bank : numpy.ndarray, optional
+        int16 bank of day keys from build_sequence_bank. Row r is replayed
+        for run r instead of drawing a fresh bootstrap sequence, so runs
+        line up across hypotheses (common random numbers).
 
     :return p_no : float
         Estimated probability of a large outbreak without vaccination.
@@ -60,12 +71,16 @@ def run_h3(
     rng = random.Random(999)
     num_agents = estimate_num_agents(daily_edges)
     households = build_households(num_agents, household_size=4, rng=rng)
+    household_of = household_index(num_agents, households)
 
     large_no_vax: List[bool] = []
     large_vax: List[bool] = []
 
-    for _ in range(num_runs):
-        seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
+    for run in range(num_runs):
+        if sequence_bank is not None:
+            seq = contact_sequence_from_bank(daily_edges, sequence_bank, run, num_days)
+        else:
+            seq = bootstrap_contact_sequence(daily_edges, num_days=num_days, rng=rng)
 
         # --- No vaccination ---
         sim_no = EpidemicSimulation(
@@ -74,7 +89,7 @@ def run_h3(
             infection_prob=infection_prob,
             infectious_days=infectious_days,
             rng=rng,
-            households=households,
+            household_of=household_of,
             isolate_symptomatic=False,
             isolate_households=False,
             vaccination_coverage=0.0,
@@ -92,7 +107,7 @@ def run_h3(
             infection_prob=infection_prob,
             infectious_days=infectious_days,
             rng=rng,
-            households=households,
+            household_of=household_of,
             isolate_symptomatic=False,
             isolate_households=False,
             vaccination_coverage=vaccination_coverage,
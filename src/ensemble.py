@@ -0,0 +1,301 @@
+import random
+from multiprocessing import Pool, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from src.simulation import EpidemicSimulation
+from src.helpers import build_households, estimate_num_agents, household_index
+
+# Per-worker views onto the shared blocks, filled in by _attach_shared
+_SHARED: Dict[str, np.ndarray] = {}
+_SEGMENTS: List[shared_memory.SharedMemory] = []
+_CONFIG: Dict[str, object] = {}
+
+
+def _create_block(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple]:
+    """
+    Copy `array` into a fresh shared memory block.
+
+    Returns the block and a small (name, shape, dtype) spec that workers
+    use to attach to it; only the spec ever crosses a process boundary.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach_shared(specs: Dict[str, Tuple], config: Dict[str, object]):
+    """Pool initializer: attach zero-copy NumPy views to every shared block."""
+    _SHARED.clear()
+    _SEGMENTS.clear()
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SEGMENTS.append(shm)
+        _SHARED[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _CONFIG.clear()
+    _CONFIG.update(config)
+
+
+def _detach_shared():
+    _SHARED.clear()
+    for shm in _SEGMENTS:
+        shm.close()
+    _SEGMENTS.clear()
+
+
+def simulate_runs(
+    inputs: Dict[str, np.ndarray],
+    config: Dict[str, object],
+    start: int,
+    stop: int,
+    history_I: np.ndarray,
+    final_R: np.ndarray,
+):
+    """
+    Simulate replicates [start, stop) of a packed scenario.
+
+    Row k of history_I and final_R receives replicate start + k, so callers
+    can pass slices of a larger (shared) buffer and have it filled in place.
+    """
+    edge_pairs = inputs["edge_pairs"]
+    day_offsets = inputs["day_offsets"]
+    day_positions = inputs["day_positions"]
+    household_of = inputs["household_of"]
+    cfg = config
+
+    for k, run in enumerate(range(start, stop)):
+        seq = [
+            edge_pairs[day_offsets[p]:day_offsets[p + 1]] for p in day_positions[run]
+        ]
+        sim = EpidemicSimulation(
+            num_agents=cfg["num_agents"],
+            contact_sequence=seq,
+            infection_prob=cfg["infection_prob"],
+            infectious_days=cfg["infectious_days"],
+            rng=random.Random(cfg["seed"] + run),
+            household_of=household_of,
+            isolate_symptomatic=cfg["isolate_symptomatic"],
+            isolate_households=cfg["isolate_households"],
+            vaccination_coverage=cfg["vaccination_coverage"],
+            external_infection_prob=cfg["external_infection_prob"],
+        )
+        sim.seed_initial_infections(cfg["initial_infected"])
+        I_curve, final = sim.run(contact_reduction=cfg["contact_reduction"])
+        history_I[k, :] = I_curve
+        final_R[k] = final
+
+
+def _run_chunk(bounds: Tuple[int, int]) -> int:
+    """
+    Simulate replicates [start, stop) and write their results in place.
+
+    Contact sequences are slices of the shared blocks and the household
+    index is the shared block itself, so
+    nothing large is copied into the worker or sent back through the pool.
+    """
+    start, stop = bounds
+    simulate_runs(
+        _SHARED,
+        _CONFIG,
+        start,
+        stop,
+        _SHARED["history_I"][start:stop],
+        _SHARED["final_R"][start:stop],
+    )
+    return stop - start
+
+
+def _chunk_bounds(num_runs: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [(s, min(s + chunk_size, num_runs)) for s in range(0, num_runs, chunk_size)]
+
+
+def pack_scenario(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    sequence_bank: np.ndarray,
+    num_runs: int,
+    num_days: int = 120,
+    infection_prob: float = 0.03,
+    infectious_days: int = 5,
+    external_infection_prob: float = 0.001,
+    initial_infected: int = 3,
+    isolate_symptomatic: bool = False,
+    isolate_households: bool = False,
+    vaccination_coverage: float = 0.0,
+    contact_reduction: float = 1.0,
+    household_size: int = 4,
+    seed: int = 0,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, object]]:
+    """
+    Pack one scenario into flat arrays plus a small config dict.
+
+    All daily edge lists go into one int32 pair array with per-day offsets.
+    Households are packed the same way, alongside an int32 per-agent
+    household index that every replicate uses as is, and the bank rows
+    become positions into the day list. This is the form simulate_runs reads, whether the
+    arrays sit in shared memory or arrived over a socket.
+
+    :return inputs : dict of NumPy arrays describing the network and replicates
+    :return config : dict of scalar scenario parameters
+    """
+    if num_runs > sequence_bank.shape[0] or num_days > sequence_bank.shape[1]:
+        raise ValueError(
+            f"sequence bank of shape {sequence_bank.shape} is too small for "
+            f"{num_runs} runs of {num_days} days"
+        )
+
+    num_agents = estimate_num_agents(daily_edges)
+    households = build_households(num_agents, household_size, random.Random(seed))
+
+    day_keys = np.array(sorted(daily_edges.keys()), dtype=np.int64)
+    runs_bank = np.asarray(sequence_bank[:num_runs, :num_days])
+    if not np.isin(runs_bank, day_keys).all():
+        raise ValueError("sequence bank refers to days missing from daily_edges")
+    day_lengths = [len(daily_edges[int(d)]) for d in day_keys]
+    day_offsets = np.zeros(len(day_keys) + 1, dtype=np.int64)
+    day_offsets[1:] = np.cumsum(day_lengths)
+    edge_pairs = np.array(
+        [pair for d in day_keys for pair in daily_edges[int(d)]], dtype=np.int32
+    ).reshape(-1, 2)
+    day_positions = np.searchsorted(day_keys, runs_bank).astype(np.int16)
+
+    hh_offsets = np.zeros(len(households) + 1, dtype=np.int64)
+    hh_offsets[1:] = np.cumsum([len(hh) for hh in households])
+    hh_members = np.array([i for hh in households for i in hh], dtype=np.int32)
+
+    inputs = {
+        "edge_pairs": edge_pairs,
+        "day_offsets": day_offsets,
+        "day_positions": day_positions,
+        "hh_members": hh_members,
+        "hh_offsets": hh_offsets,
+        "household_of": household_index(num_agents, households),
+    }
+    config = {
+        "num_agents": num_agents,
+        "infection_prob": infection_prob,
+        "infectious_days": infectious_days,
+        "external_infection_prob": external_infection_prob,
+        "initial_infected": initial_infected,
+        "isolate_symptomatic": isolate_symptomatic,
+        "isolate_households": isolate_households,
+        "vaccination_coverage": vaccination_coverage,
+        "contact_reduction": contact_reduction,
+        "seed": seed,
+        "num_runs": num_runs,
+        "num_days": num_days,
+    }
+    return inputs, config
+
+
+def run_ensemble(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    sequence_bank: np.ndarray,
+    num_runs: int,
+    num_days: int = 120,
+    infection_prob: float = 0.03,
+    infectious_days: int = 5,
+    external_infection_prob: float = 0.001,
+    initial_infected: int = 3,
+    isolate_symptomatic: bool = False,
+    isolate_households: bool = False,
+    vaccination_coverage: float = 0.0,
+    contact_reduction: float = 1.0,
+    household_size: int = 4,
+    seed: int = 0,
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run one scenario's replicates across a pool of worker processes.
+
+    The contact network (all daily edge lists packed into one int32 pair
+    array plus per-day offsets), the household structure and per-agent
+    household index, the replicate day positions taken from the sequence
+    bank and the output buffers all live in multiprocessing.shared_memory
+    blocks. Workers attach zero-copy
+    NumPy views once, receive only (start, stop) replicate ranges, and
+    write history_I rows and final sizes straight into the shared output.
+
+    Replicate r uses row r of the sequence bank and random.Random(seed + r),
+    so results do not depend on the number of workers or the chunking.
+
+    :param daily_edges : Mapping from day index to a list of (i, j) contact pairs
+    :param sequence_bank : int16 bank of day keys from build_sequence_bank
+    :param num_runs : Number of replicates to simulate
+    :param num_days : Number of synthetic days per replicate
+    :param workers : Number of worker processes; 1 runs in the calling process
+    :param chunk_size : Replicates handed to a worker at a time
+        (default: spread evenly, four chunks per worker)
+
+    :return history_I : int32 array (num_runs, num_days) of daily infectious counts
+    :return final_R : int32 array (num_runs,) of final recovered counts
+
+    >>> from src.helpers import build_sequence_bank
+    >>> edges = {0: [(0, 1), (1, 2)], 1: [(2, 3)]}
+    >>> bank = build_sequence_bank(edges, num_runs=4, num_days=6, seed=1)
+    >>> hist, final = run_ensemble(edges, bank, num_runs=4, num_days=6, infection_prob=0.5)
+    >>> hist.shape, final.shape
+    ((4, 6), (4,))
+    >>> hist2, final2 = run_ensemble(edges, bank, num_runs=4, num_days=6,
+    ...                              infection_prob=0.5, workers=2, chunk_size=1)
+    >>> bool((hist == hist2).all() and (final == final2).all())
+    True
+    """
+    inputs, config = pack_scenario(
+        daily_edges,
+        sequence_bank,
+        num_runs,
+        num_days=num_days,
+        infection_prob=infection_prob,
+        infectious_days=infectious_days,
+        external_infection_prob=external_infection_prob,
+        initial_infected=initial_infected,
+        isolate_symptomatic=isolate_symptomatic,
+        isolate_households=isolate_households,
+        vaccination_coverage=vaccination_coverage,
+        contact_reduction=contact_reduction,
+        household_size=household_size,
+        seed=seed,
+    )
+    arrays = dict(
+        inputs,
+        history_I=np.zeros((num_runs, num_days), dtype=np.int32),
+        final_R=np.zeros(num_runs, dtype=np.int32),
+    )
+
+    if chunk_size is None:
+        chunk_size = max(1, -(-num_runs // (4 * max(workers, 1))))
+    chunks = _chunk_bounds(num_runs, chunk_size)
+
+    blocks: Dict[str, shared_memory.SharedMemory] = {}
+    specs: Dict[str, Tuple] = {}
+    try:
+        for key, array in arrays.items():
+            blocks[key], specs[key] = _create_block(array)
+
+        if workers <= 1:
+            _attach_shared(specs, config)
+            try:
+                for bounds in chunks:
+                    _run_chunk(bounds)
+            finally:
+                _detach_shared()
+        else:
+            with Pool(processes=workers, initializer=_attach_shared,
+                      initargs=(specs, config)) as pool:
+                for _ in pool.imap_unordered(_run_chunk, chunks):
+                    pass
+
+        # Copy the results out before the blocks are released
+        out = {
+            key: np.ndarray(
+                arrays[key].shape, dtype=arrays[key].dtype, buffer=blocks[key].buf
+            ).copy()
+            for key in ("history_I", "final_R")
+        }
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+
+    return out["history_I"], out["final_R"]
@@ -1,4 +1,6 @@
 # helpers.py
+import hashlib
+import os
 import random
 from typing import Dict, List, Tuple
 import numpy as np
@@ -11,6 +13,24 @@ def build_households(num_agents: int, household_size: int, rng: random.Random):
         households.append(idxs[i:i+household_size])
     return households
 
+def household_index(num_agents: int, households) -> np.ndarray:
+    """
+    Per-agent household number (-1 for agents in no household).
+
+    Build this once per household structure and pass it to every
+    EpidemicSimulation that uses those households.
+
+    >>> household_index(5, [[3, 0], [1]]).tolist()
+    [0, 1, -1, 0, -1]
+    """
+    sizes = np.fromiter((len(hh) for hh in households), dtype=np.int64, count=len(households))
+    members = np.fromiter(
+        (i for hh in households for i in hh), dtype=np.int64, count=int(sizes.sum())
+    )
+    index = np.full(num_agents, -1, dtype=np.int32)
+    index[members] = np.repeat(np.arange(len(households), dtype=np.int32), sizes)
+    return index
+
 def bootstrap_contact_sequence(
     daily_edges: Dict[int, List[Tuple[int, int]]],
     num_days: int,
@@ -30,3 +50,133 @@ def estimate_num_agents(daily_edges):
             ids.add(i); ids.add(j)
     return max(ids) + 1
 
+
+
+def build_sequence_bank(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    num_runs: int,
+    num_days: int,
+    seed: int,
+) -> np.ndarray:
+    """
+    Draw a bank of bootstrapped contact sequences once, up front.
+
+    Row r of the bank plays the role of one call to
+    bootstrap_contact_sequence: it holds the observed day keys to replay
+    on each synthetic day of replicate r. Runners that index the same bank
+    see identical contact sequences (common random numbers), so scenarios
+    and sweep cells can be compared on equal footing.
+
+    :param daily_edges : Mapping from day index to a list of (i, j) contact pairs
+    :param num_runs : Number of replicates (rows) in the bank
+    :param num_days : Number of synthetic days (columns) per replicate
+    :param seed : Seed for the bootstrap draws
+
+    :return bank : int16 array of shape (num_runs, num_days) holding day keys
+
+    >>> edges = {1: [(0, 1)], 22: [(1, 2)]}
+    >>> bank = build_sequence_bank(edges, num_runs=3, num_days=4, seed=0)
+    >>> bank.shape, bank.dtype
+    ((3, 4), dtype('int16'))
+    >>> set(bank.ravel().tolist()) <= {1, 22}
+    True
+    >>> bool((bank == build_sequence_bank(edges, 3, 4, seed=0)).all())
+    True
+    """
+    day_keys = np.array(sorted(daily_edges.keys()), dtype=np.int64)
+    info = np.iinfo(np.int16)
+    if day_keys.min() < info.min or day_keys.max() > info.max:
+        raise ValueError("day keys do not fit in an int16 sequence bank")
+
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(day_keys), size=(num_runs, num_days))
+    return day_keys[picks].astype(np.int16)
+
+
+def load_or_build_sequence_bank(
+    path: str,
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    num_runs: int,
+    num_days: int,
+    seed: int,
+) -> np.ndarray:
+    """
+    Memory-map a persisted sequence bank, building and saving it first if
+    the file is missing, too small for the requested shape, or was drawn
+    with a different seed or from a different set of day keys.
+
+    The seed and a digest of the sorted day keys are kept in a
+    "<path>.seed" sidecar, so a bank built before the data gained or lost
+    days is redrawn rather than reused. Both files are written to
+    a temporary name and moved into place, so workers that already mapped
+    an older bank keep valid pages. The returned array is opened read-only
+    with mmap_mode="r", so any number of worker processes can share it.
+
+    >>> import os, tempfile
+    >>> edges = {1: [(0, 1)], 2: [(1, 2)]}
+    >>> path = os.path.join(tempfile.mkdtemp(), "bank.npy")
+    >>> bank = load_or_build_sequence_bank(path, edges, 2, 5, seed=7)
+    >>> bank.shape, os.path.exists(path)
+    ((2, 5), True)
+    >>> again = load_or_build_sequence_bank(path, edges, 2, 5, seed=7)
+    >>> bool((bank == again).all())
+    True
+    >>> other = load_or_build_sequence_bank(path, edges, 2, 5, seed=8)
+    >>> bool((other == build_sequence_bank(edges, 2, 5, seed=8)).all())
+    True
+    >>> shifted = load_or_build_sequence_bank(path, {3: [(0, 1)]}, 2, 5, seed=8)
+    >>> set(shifted.ravel().tolist())
+    {3}
+    >>> grown = load_or_build_sequence_bank(path, {3: [(0, 1)], 4: [(1, 2)]}, 2, 5, seed=8)
+    >>> sorted(set(grown.ravel().tolist()))
+    [3, 4]
+    """
+    seed_path = f"{path}.seed"
+    day_keys = np.array(sorted(daily_edges.keys()), dtype=np.int64)
+    stamp = f"{seed} {hashlib.sha256(day_keys.tobytes()).hexdigest()}"
+    if os.path.exists(path) and os.path.exists(seed_path):
+        with open(seed_path) as f:
+            stored_stamp = f.read().strip()
+        bank = np.load(path, mmap_mode="r")
+        if (
+            stored_stamp == stamp
+            and bank.shape[0] >= num_runs
+            and bank.shape[1] >= num_days
+        ):
+            return bank
+
+    bank = build_sequence_bank(daily_edges, num_runs, num_days, seed)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    suffix = f".{os.getpid()}.tmp"
+    with open(path + suffix, "wb") as f:
+        np.save(f, bank)
+    os.replace(path + suffix, path)
+    with open(seed_path + suffix, "w") as f:
+        f.write(stamp)
+    os.replace(seed_path + suffix, seed_path)
+    return np.load(path, mmap_mode="r")
+
+
+def contact_sequence_from_bank(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    bank: np.ndarray,
+    run: int,
+    num_days: int,
+) -> List[List[Tuple[int, int]]]:
+    """
+    Look up the contact sequence for replicate `run` in a sequence bank.
+
+    >>> edges = {1: [(0, 1)], 2: [(1, 2)]}
+    >>> bank = np.array([[1, 2, 2], [2, 1, 1]], dtype=np.int16)
+    >>> contact_sequence_from_bank(edges, bank, run=1, num_days=2)
+    [[(1, 2)], [(0, 1)]]
+    """
+    if run >= bank.shape[0] or num_days > bank.shape[1]:
+        raise ValueError(
+            f"sequence bank of shape {bank.shape} is too small for "
+            f"run {run} with {num_days} days"
+        )
+    return [daily_edges[int(d)] for d in bank[run, :num_days]]
@@ -0,0 +1,435 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from src.helpers import estimate_num_agents
+
+
+def daily_pair_counts(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count the contacts of every agent pair on every observed day.
+
+    Each logged contact is a separate transmission chance in
+    EpidemicSimulation. The same pair usually meets dozens of times a
+    day, so the screen works per pair rather than per contact event.
+
+    :return pairs : int array (num_pairs, 2) of undirected pairs with i < j
+    :return counts : int array (num_observed_days, num_pairs) of contacts per day
+
+    >>> edges = {1: [(0, 1), (1, 0), (1, 2)], 2: [(2, 1)]}
+    >>> pairs, counts = daily_pair_counts(edges)
+    >>> pairs.tolist(), counts.tolist()
+    ([[0, 1], [1, 2]], [[2, 1], [0, 1]])
+    """
+    days = sorted(daily_edges.keys())
+    per_day = []
+    for day in days:
+        arr = np.asarray(daily_edges[day], dtype=np.int64).reshape(-1, 2)
+        arr = np.sort(arr[arr[:, 0] != arr[:, 1]], axis=1)
+        per_day.append(arr)
+
+    all_pairs = np.concatenate(per_day) if per_day else np.empty((0, 2), dtype=np.int64)
+    pairs, inverse = np.unique(all_pairs, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    counts = np.zeros((len(days), len(pairs)), dtype=np.int64)
+    offset = 0
+    for row, arr in enumerate(per_day):
+        idx = inverse[offset:offset + len(arr)]
+        counts[row] = np.bincount(idx, minlength=len(pairs))
+        offset += len(arr)
+    return pairs, counts
+
+
+def _transmission_rounds(
+    infectious_days: int,
+    isolate_symptomatic: bool,
+) -> Tuple[Dict[int, float], Dict[int, float]]:
+    """
+    Distribution of transmission rounds an infected agent gets.
+
+    EpidemicSimulation.step runs transmission and progression twice per
+    day over the same active edges. A case infected during the run has
+    infectious_days - 1 rounds before recovering, and a seeded case gets
+    one more because it starts on day 0. With isolation, the mask is fixed
+    at the start of each day from days_in_state >= 1. A new case therefore
+    transmits once if infected in the first pass and never if infected in
+    the second. A seed transmits in both passes of day 0. Both counts are
+    capped by the uncapped ones, so a one-day infectious period leaves new
+    cases no rounds and seeds one.
+
+    :return secondary, seed : {rounds: probability} for secondary and seeded cases
+
+    >>> _transmission_rounds(5, True)
+    ({0: 0.5, 1: 0.5}, {2: 1.0})
+    >>> _transmission_rounds(1, True)
+    ({0: 1.0}, {1: 1.0})
+    """
+    secondary = max(infectious_days - 1, 0)
+    seed = max(infectious_days, 0)
+    if isolate_symptomatic:
+        rounds: Dict[int, float] = {0: 0.5}
+        first_pass = min(1, secondary)
+        rounds[first_pass] = rounds.get(first_pass, 0.0) + 0.5
+        return rounds, {min(2, seed): 1.0}
+    return {secondary: 1.0}, {seed: 1.0}
+
+
+def _neighbour_sum(pairs: np.ndarray, f, num_agents: int) -> np.ndarray:
+    """
+    Sum f(partner) over each agent's pairs.
+
+    f maps an array of partner indices to per-pair values, so that
+    agent i collects f(j) from pair (i, j) and agent j collects f(i).
+    """
+    return np.bincount(pairs[:, 0], weights=f(pairs[:, 1]), minlength=num_agents) + \
+        np.bincount(pairs[:, 1], weights=f(pairs[:, 0]), minlength=num_agents)
+
+
+def _offspring_pgf(
+    pairs: np.ndarray,
+    escape: np.ndarray,
+    rounds: Dict[int, float],
+    susceptible: float,
+    s: np.ndarray,
+) -> np.ndarray:
+    """
+    Per-agent offspring PGF evaluated at the per-agent vector s.
+
+    For n rounds, partner j escapes infection by i with probability
+    escape ** n, where escape is the mean daily chance of dodging every contact.
+    """
+    num_agents = len(s)
+    pgf = np.zeros(num_agents)
+    for n, prob in rounds.items():
+        T = susceptible * (1.0 - escape ** n)
+        with np.errstate(divide="ignore"):
+            log_pgf = _neighbour_sum(
+                pairs, lambda j: np.log1p(-T * (1.0 - s[j])), num_agents
+            )
+        pgf += prob * np.exp(log_pgf)
+    return pgf
+
+
+def _final_size(
+    pairs: np.ndarray,
+    T: np.ndarray,
+    vaccination_coverage: float,
+    sparked: float,
+    z: np.ndarray,
+) -> float:
+    """
+    Iterate z_i = (1 - v) * (1 - (1 - sparked) * prod_j (1 - T_ij z_j)) from z.
+
+    sparked is each agent's chance of being seeded or infected from
+    outside. Starting from z = 1 - v reaches the major-outbreak solution.
+    Returns the fraction of agents recovered or vaccinated.
+    """
+    num_agents = len(z)
+    v = vaccination_coverage
+    with np.errstate(divide="ignore"):
+        for _ in range(10_000):
+            log_escape = _neighbour_sum(pairs, lambda j: np.log1p(-T * z[j]), num_agents)
+            z_next = (1.0 - v) * (1.0 - (1.0 - sparked) * np.exp(log_escape))
+            if np.abs(z_next - z).max() < 1e-12:
+                z = z_next
+                break
+            z = z_next
+    return v + float(z.mean())
+
+
+def _minor_cluster_sizes(
+    pairs: np.ndarray,
+    escape: np.ndarray,
+    secondary_rounds: Dict[int, float],
+    seed_rounds: Dict[int, float],
+    susceptible: float,
+    q: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Expected size of a chain that dies out, by the agent that starts it.
+
+    Conditioning a branching process on extinction gives another,
+    subcritical branching process. An agent of type i whose chain dies out
+    infects partner j with mean
+    sum_n P(n) * G_i^n(q) / G_i(q) * T^n_ij q_j / (1 - T^n_ij (1 - q_j)),
+    where G_i^n is its offspring PGF over n rounds. Expected cluster sizes
+    then solve c = 1 + M c. With q = 1 (a subcritical scenario) M is just
+    the mean next-generation matrix.
+
+    :return secondary, seed : per-agent expected cluster sizes for chains
+        started by a new case and by a seeded case
+    """
+    num_agents = len(q)
+
+    def extinct_means(rounds):
+        total = _offspring_pgf(pairs, escape, rounds, susceptible, q)
+        safe_total = np.where(total > 0.0, total, 1.0)
+        fwd = np.zeros(len(pairs))
+        bwd = np.zeros(len(pairs))
+        for n, prob in rounds.items():
+            share = prob * _offspring_pgf(pairs, escape, {n: 1.0}, susceptible, q) / safe_total
+            T = susceptible * (1.0 - escape ** n)
+            for out, src, dst in ((fwd, pairs[:, 0], pairs[:, 1]), (bwd, pairs[:, 1], pairs[:, 0])):
+                # T = 1 with q = 0 means the partner surely starts a major chain: no mass
+                denom = 1.0 - T * (1.0 - q[dst])
+                out += share[src] * np.divide(
+                    T * q[dst], denom, out=np.zeros(len(pairs)), where=denom > 0.0
+                )
+        return fwd, bwd
+
+    def apply(fwd, bwd, c):
+        return np.bincount(pairs[:, 0], weights=fwd * c[pairs[:, 1]], minlength=num_agents) + \
+            np.bincount(pairs[:, 1], weights=bwd * c[pairs[:, 0]], minlength=num_agents)
+
+    sec_fwd, sec_bwd = extinct_means(secondary_rounds)
+    c = np.ones(num_agents)
+    for _ in range(10_000):
+        c_next = 1.0 + apply(sec_fwd, sec_bwd, c)
+        if np.abs(c_next - c).max() < 1e-9 * c_next.max():
+            c = c_next
+            break
+        c = c_next
+
+    seed_fwd, seed_bwd = extinct_means(seed_rounds)
+    return c, 1.0 + apply(seed_fwd, seed_bwd, c)
+
+
+def screen_scenario(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    num_days: int = 120,
+    infection_prob: float = 0.03,
+    infectious_days: int = 5,
+    external_infection_prob: float = 0.001,
+    initial_infected: int = 3,
+    isolate_symptomatic: bool = False,
+    isolate_households: bool = False,
+    vaccination_coverage: float = 0.0,
+    contact_reduction: float = 1.0,
+    pair_counts: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Dict[str, float]:
+    """Screen a scenario with a branching process instead of agent runs.
+
+    Each transmission round replays a random observed day, as
+    bootstrap_contact_sequence does. Every contact that day transmits
+    with probability infection_prob * contact_reduction. Across its
+    rounds, an infectious agent therefore infects partner j with
+    probability T_ij = (1 - v) * (1 - E[(1 - p)^m_ij] ** rounds), where
+    m_ij is the pair's daily contact count and v the vaccination coverage.
+    Treating each agent as its own type gives a multi-type branching
+    process. R0 is the spectral radius of its next-generation matrix T.
+    The extinction probabilities, the initial seeds and a Poisson number
+    of external introductions give the probability of a major outbreak.
+    The major final size comes from the matching mean-field equations,
+    with seeds and external infections as a constant spark (see
+    _final_size). The minor size spreads the expected clusters of the
+    seeds and external cases over the susceptibles, for the case where
+    every chain dies out (see _minor_cluster_sizes). It is capped at the
+    major size. Household isolation is screened like
+    symptomatic isolation. This overstates transmission,
+    because whole households drop out too.
+
+    :param daily_edges : Mapping from day index to a list of (i, j) contact pairs
+    :param pair_counts : Optional precomputed daily_pair_counts, reused across cells
+
+    :return screen : dict with
+        R0 (mean secondary cases of a typical new case),
+        p_major (probability that at least one chain does not die out),
+        final_size (fraction of agents recovered or vaccinated at the end of
+        a major outbreak, on the same footing as the final_R of a run), and
+        minor_size (the same fraction when no chain takes off)
+
+    >>> edges = {0: [(0, 1), (1, 2), (2, 3), (3, 0)]}
+    >>> low = screen_scenario(edges, infection_prob=0.05, external_infection_prob=0.0)
+    >>> high = screen_scenario(edges, infection_prob=0.5, external_infection_prob=0.0)
+    >>> low["R0"] < 1 < high["R0"]
+    True
+    >>> low["p_major"] == 0.0 and 0 < high["p_major"] <= 1
+    True
+    >>> high["minor_size"] < high["final_size"]
+    True
+    """
+    if pair_counts is None:
+        pair_counts = daily_pair_counts(daily_edges)
+    pairs, counts = pair_counts
+    num_agents = estimate_num_agents(daily_edges)
+
+    v = vaccination_coverage
+    p_eff = infection_prob * contact_reduction
+    isolate = isolate_symptomatic or isolate_households
+    secondary_rounds, seed_rounds = _transmission_rounds(infectious_days, isolate)
+
+    # Chance a pair's contacts on a random observed day all fail to transmit
+    escape = ((1.0 - p_eff) ** counts).mean(axis=0)
+    T_raw = sum(prob * (1.0 - escape ** n) for n, prob in secondary_rounds.items())
+    T_mean = (1.0 - v) * T_raw
+
+    # R0: spectral radius of the symmetric next-generation matrix
+    x = np.ones(num_agents)
+    R0 = 0.0
+    for _ in range(1_000):
+        y = _neighbour_sum(pairs, lambda j: T_mean * x[j], num_agents)
+        R0_next = float(np.linalg.norm(y))
+        if R0_next == 0.0:
+            break
+        converged = abs(R0_next - R0) < 1e-10
+        x, R0 = y / R0_next, R0_next
+        if converged:
+            break
+
+    external = 1.0 - (1.0 - external_infection_prob) ** num_days
+    seeded = min(initial_infected, num_agents) / num_agents
+    sparked = min(external + seeded, 1.0)
+    introductions = num_agents * (1.0 - v) * external_infection_prob * num_days
+
+    # Extinction probabilities of chains started by each agent: q = G(q)
+    q = np.ones(num_agents)
+    if R0 > 1.0:
+        q = np.zeros(num_agents)
+        for _ in range(10_000):
+            q_next = _offspring_pgf(pairs, escape, secondary_rounds, 1.0 - v, q)
+            if np.abs(q_next - q).max() < 1e-12:
+                q = q_next
+                break
+            q = q_next
+
+    # Minor outbreak: seeds and external cases with their finite clusters
+    cluster_sec, cluster_seed = _minor_cluster_sizes(
+        pairs, escape, secondary_rounds, seed_rounds, 1.0 - v, q
+    )
+    minor_cases = initial_infected * cluster_seed.mean() + introductions * cluster_sec.mean()
+    # Clusters ignore depletion, so spread the expected cases over the
+    # susceptibles as independent hits rather than adding them up
+    susceptibles = num_agents * (1.0 - v)
+    minor_size = v + (1.0 - v) * (1.0 - math.exp(-float(minor_cases) / susceptibles)) \
+        if susceptibles > 0 else v
+
+    if R0 <= 1.0:
+        return {"R0": R0, "p_major": 0.0, "final_size": minor_size, "minor_size": minor_size}
+
+    seed_extinct = float(_offspring_pgf(pairs, escape, seed_rounds, 1.0 - v, q).mean())
+    external_extinct = float(q.mean())
+    p_none = seed_extinct ** initial_infected * math.exp(
+        -introductions * (1.0 - external_extinct)
+    )
+
+    final_size = _final_size(pairs, T_raw, v, sparked, np.full(num_agents, 1.0 - v))
+    # Chains that die out cannot reach more agents than a major outbreak
+    minor_size = min(minor_size, final_size)
+
+    return {
+        "R0": R0,
+        "p_major": float(1.0 - p_none),
+        "final_size": final_size,
+        "minor_size": minor_size,
+    }
+
+
+def replicates_for_screen(
+    screen: Dict[str, float],
+    max_runs: int = 300,
+    min_runs: int = 20,
+) -> int:
+    """
+    Number of full agent-based replicates a screened cell needs.
+
+    Replicates scale with the Bernoulli variance p_major * (1 - p_major),
+    so clearly sub-critical or clearly explosive cells get min_runs and
+    cells near the threshold get up to max_runs.
+
+    >>> replicates_for_screen({"p_major": 0.0})
+    20
+    >>> replicates_for_screen({"p_major": 0.5})
+    300
+    >>> replicates_for_screen({"p_major": 0.9})
+    108
+    """
+    p = screen["p_major"]
+    runs = math.ceil(max_runs * 4.0 * p * (1.0 - p))
+    return int(min(max(runs, min_runs), max_runs))
+
+
+def plan_sweep(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    cells: List[Dict[str, float]],
+    max_runs: int = 300,
+    min_runs: int = 20,
+) -> List[Tuple[Dict[str, float], Dict[str, float], int]]:
+    """
+    Screen every sweep cell and decide its agent-based replicate budget.
+
+    :param cells : list of keyword dicts for screen_scenario (one per cell)
+
+    :return plan : list of (cell, screen, num_runs) tuples, in cell order
+
+    >>> edges = {0: [(0, 1), (1, 2), (2, 3), (3, 0)]}
+    >>> plan = plan_sweep(edges, [{"infection_prob": 0.01}, {"infection_prob": 0.3}])
+    >>> [runs for _, _, runs in plan][0]
+    20
+    """
+    pair_counts = daily_pair_counts(daily_edges)
+    plan = []
+    for cell in cells:
+        screen = screen_scenario(daily_edges, pair_counts=pair_counts, **cell)
+        plan.append((cell, screen, replicates_for_screen(screen, max_runs, min_runs)))
+    return plan
+
+
+def report_tier_agreement(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    rows: List[Tuple[str, Optional[Dict[str, float]], str, Optional[float]]],
+) -> List[Tuple[str, Optional[float], Optional[float]]]:
+    """
+    Print screening estimates next to the Monte Carlo results they predict.
+
+    :param rows : (label, screen_scenario kwargs, metric, Monte Carlo value).
+        metric "attack" compares the mean final_R / num_agents of the full
+        runs with p_major * final_size + (1 - p_major) * minor_size.
+        metric "p_large" compares P(final_R / num_agents >= 0.5) with p_major,
+        counted only if a major outbreak reaches that size. A Monte Carlo
+        value of None prints the screen alone. Kwargs of None mark a
+        scenario the screen does not model separately; its Monte Carlo
+        value is printed with no screening value.
+
+    :return agreement : list of (label, screening value, Monte Carlo value)
+
+    >>> edges = {0: [(0, 1), (1, 2)]}
+    >>> out = report_tier_agreement(edges, [
+    ...     ("toy", {"infection_prob": 0.01}, "attack", 0.0),
+    ...     ("toy households", None, "attack", 0.25),
+    ... ])  # doctest: +ELLIPSIS
+    Screening vs Monte Carlo:
+      toy: R0=... p_major=... screen attack=... MC attack=0.0
+      toy households: not screened separately, MC attack=0.25
+    >>> out[1]
+    ('toy households', None, 0.25)
+    """
+    pair_counts = daily_pair_counts(daily_edges)
+    agreement = []
+
+    print("Screening vs Monte Carlo:")
+    for label, cell, metric, mc_value in rows:
+        if cell is None:
+            print(f"  {label}: not screened separately, MC {metric}={round(mc_value, 3)}")
+            agreement.append((label, None, mc_value))
+            continue
+
+        screen = screen_scenario(daily_edges, pair_counts=pair_counts, **cell)
+        p_major = screen["p_major"]
+        if metric == "attack":
+            predicted = p_major * screen["final_size"] + (1.0 - p_major) * screen["minor_size"]
+        elif metric == "p_large":
+            predicted = p_major if screen["final_size"] >= 0.5 else 0.0
+        else:
+            raise ValueError(f"unknown metric: {metric}")
+
+        mc_text = "n/a" if mc_value is None else round(mc_value, 3)
+        print(
+            f"  {label}: R0={screen['R0']:.2f} p_major={p_major:.3f} "
+            f"screen {metric}={predicted:.3f} MC {metric}={mc_text}"
+        )
+        agreement.append((label, predicted, mc_value))
+
+    return agreement
@@ -1,10 +1,31 @@
 import numpy as np
 import random
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
+
+from src.helpers import household_index
 
 S, I, R = 0, 1, 2  # simple SIR for clarity
 
+
 class EpidemicSimulation:
+    """
+    Agent-based SIR simulation over a sequence of daily contact lists.
+
+    Per-agent state is kept compact for large ensembles: a uint8 SIR
+    code and a uint8 day counter (uint16 for infectious periods over 255
+    days), i.e. two bytes per agent. Vaccinated agents simply start in
+    state R. The household index used for household isolation is passed
+    in via household_of and shared across replicates, rather than
+    rebuilt for each one.
+
+    >>> sim = EpidemicSimulation(16, [[(0, 1)]], 0.5, 5, random.Random(0),
+    ...                          vaccination_coverage=0.5)
+    >>> sim.state.nbytes + sim.days_in_state.nbytes
+    32
+    >>> int(np.count_nonzero(sim.state == R))
+    8
+    """
+
     def __init__(
         self,
         num_agents: int,
@@ -17,6 +38,7 @@ class EpidemicSimulation:
         isolate_households: bool = False,
         vaccination_coverage: float = 0.0,
         external_infection_prob: float = 0.0,
+        household_of: Optional[np.ndarray] = None,
     ):
         self.num_agents = num_agents
         self.contact_sequence = contact_sequence
@@ -30,15 +52,27 @@ class EpidemicSimulation:
         self.isolate_households = isolate_households
         self.external_infection_prob = external_infection_prob
 
-        self.state = np.full(num_agents, S, dtype=int)
-        self.days_in_state = np.zeros(num_agents, dtype=int)
+        # Compact state: one byte per agent for the SIR code and, while the
+        # infectious period fits, one byte for the day counter
+        self.state = np.full(num_agents, S, dtype=np.uint8)
+        days_dtype = np.uint8 if infectious_days <= np.iinfo(np.uint8).max else np.uint16
+        self.days_in_state = np.zeros(num_agents, dtype=days_dtype)
+
+        # Household number per agent (-1 if none); only household isolation
+        # reads it, and a caller-supplied index is used without copying
+        self._household_of = None
+        if isolate_households:
+            if household_of is None and households is not None:
+                household_of = household_index(num_agents, households)
+            if household_of is not None:
+                self._household_of = household_of
+                self._num_households = int(household_of.max(initial=-1)) + 1
 
         # Vaccination
         if vaccination_coverage > 0.0:
             n_vax = int(num_agents * vaccination_coverage)
             vaccinated_idxs = rng.sample(range(num_agents), n_vax)
-            for idx in vaccinated_idxs:
-                self.state[idx] = R
+            self.state[vaccinated_idxs] = R
 
     def seed_initial_infections(self, num_initial: int = 3):
         """
@@ -67,93 +101,99 @@ class EpidemicSimulation:
 
 
     def _get_isolated_mask(self):
+        """Boolean mask of agents isolated today, or None if nobody can be."""
+        if not (self.isolate_symptomatic or self._household_of is not None):
+            return None
+
         isolated = np.zeros(self.num_agents, dtype=bool)
+        infectious = self.state == I
 
-    # Only isolate symptomatic infections if enabled
+        # Only isolate symptomatic infections if enabled
         if self.isolate_symptomatic:
-        # "symptomatic" = infectious for at least 1 day
-            infectious_idxs = np.where((self.state == I) & (self.days_in_state >= 1))[0]
-            isolated[infectious_idxs] = True
+            # "symptomatic" = infectious for at least 1 day
+            isolated |= infectious & (self.days_in_state >= 1)
 
-    # Household isolation: if any infectious in HH, isolate entire HH
-        if self.isolate_households and self.households is not None:
-            for hh in self.households:
-                if any(self.state[i] == I for i in hh):
-                    for i in hh:
-                        isolated[i] = True
+        # Household isolation: if any infectious in HH, isolate entire HH
+        if self._household_of is not None:
+            in_hh = self._household_of >= 0
+            hh_infectious = np.zeros(self._num_households + 1, dtype=bool)
+            hh_infectious[self._household_of[infectious & in_hh]] = True
+            isolated |= in_hh & hh_infectious[self._household_of]
 
         return isolated
 
+    def _progress(self):
+        """Advance day counters of infectious agents and recover those done."""
+        infectious = self.state == I
+        self.days_in_state[infectious] += 1
+        recovered = infectious & (self.days_in_state >= self.infectious_days)
+        self.state[recovered] = R
+        self.days_in_state[recovered] = 0
+
+    def _transmit(self, active_edges: np.ndarray, new_infected):
+        # Only infectious-susceptible contacts draw random numbers, so the
+        # rest can be skipped without changing the random stream
+        si = self.state[active_edges[:, 0]]
+        sj = self.state[active_edges[:, 1]]
+        live = np.flatnonzero(((si == I) & (sj == S)) | ((sj == I) & (si == S)))
+
+        for (i, j), state_i, state_j in zip(
+            active_edges[live].tolist(), si[live].tolist(), sj[live].tolist()
+        ):
+            # symmetrical contacts
+            if state_i == I and state_j == S and self.rng.random() < self.infection_prob:
+                new_infected.append(j)
+            if state_j == I and state_i == S and self.rng.random() < self.infection_prob:
+                new_infected.append(i)
+
+        for p in new_infected:
+            if self.state[p] == S:
+                self.state[p] = I
+                self.days_in_state[p] = 0
+
     def step(self, day: int, contact_reduction: float = 1.0):
         edges = self.contact_sequence[day]
 
         # 1. External infections from untracked population
         new_infected = []
         if self.external_infection_prob > 0:
-            for person in range(self.num_agents):
-                if self.state[person] == S and self.rng.random() < self.external_infection_prob:
+            for person in np.flatnonzero(self.state == S).tolist():
+                if self.rng.random() < self.external_infection_prob:
                     new_infected.append(person)
 
-        # 2. Apply isolation
+        # 2. Apply isolation. Edge lists become (k, 2) arrays; views onto
+        # shared memory are used as they are
+        active_edges = np.asarray(edges, dtype=np.int32).reshape(-1, 2)
         isolated = self._get_isolated_mask()
-        active_edges = [(i, j) for (i, j) in edges if not isolated[i] and not isolated[j]]
+        if isolated is not None:
+            keep = ~(isolated[active_edges[:, 0]] | isolated[active_edges[:, 1]])
+            active_edges = active_edges[keep]
 
-        # 3. Apply contact reduction
+        # 3. Apply contact reduction (sampling indices draws the same
+        # random numbers as sampling the edges themselves)
         if 0 < contact_reduction < 1.0 and len(active_edges) > 0:
             k = int(len(active_edges) * contact_reduction)
             k = max(k, 0)
-            active_edges = self.rng.sample(active_edges, k)
+            active_edges = active_edges[self.rng.sample(range(len(active_edges)), k)]
 
         # 4. Transmission via observed contacts
-        for (i, j) in active_edges:
-            if self.state[i] == I and self.state[j] == S and self.rng.random() < self.infection_prob:
-                new_infected.append(j)
-            if self.state[j] == I and self.state[i] == S and self.rng.random() < self.infection_prob:
-                new_infected.append(i)
-
-        for p in new_infected:
-            if self.state[p] == S:
-                self.state[p] = I
-                self.days_in_state[p] = 0
+        self._transmit(active_edges, new_infected)
 
         # 5. Progression I to R
-        for p in range(self.num_agents):
-            if self.state[p] == I:
-                self.days_in_state[p] += 1
-                if self.days_in_state[p] >= self.infectious_days:
-                    self.state[p] = R
-                    self.days_in_state[p] = 0
-
+        self._progress()
 
         # Transmission
-        new_infected = []
-        for (i, j) in active_edges:
-            # symmetrical contacts
-            if self.state[i] == I and self.state[j] == S and self.rng.random() < self.infection_prob:
-                new_infected.append(j)
-            if self.state[j] == I and self.state[i] == S and self.rng.random() < self.infection_prob:
-                new_infected.append(i)
-
-        for p in new_infected:
-            if self.state[p] == S:
-                self.state[p] = I
-                self.days_in_state[p] = 0
+        self._transmit(active_edges, [])
 
         # Progression I -> R
-        for p in range(self.num_agents):
-            if self.state[p] == I:
-                self.days_in_state[p] += 1
-                if self.days_in_state[p] >= self.infectious_days:
-                    self.state[p] = R
-                    self.days_in_state[p] = 0
+        self._progress()
 
     def run(self, contact_reduction: float = 1.0):
-        history_I = []
+        history_I = np.zeros(self.T, dtype=np.int32)
 
         for day in range(self.T):
-            history_I.append(np.sum(self.state == I))
+            history_I[day] = np.count_nonzero(self.state == I)
             self.step(day, contact_reduction=contact_reduction)
 
-        history_I = np.array(history_I)
-        final_R = np.sum(self.state == R)
+        final_R = int(np.count_nonzero(self.state == R))
         return history_I, final_R
@@ -0,0 +1,522 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from multiprocessing import AuthenticationError, Process
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from src.ensemble import _chunk_bounds, pack_scenario, simulate_runs
+
+AUTHKEY_ENV = "WORKQUEUE_AUTHKEY"
+
+
+class ChunkLeases:
+    """
+    Lease bookkeeping for replicate chunks, kept free of any I/O.
+
+    A chunk is pending, leased to one owner until a deadline, or done.
+    Expired leases and the leases of owners that disconnect go back to
+    the front of the pending queue, so lost chunks are re-dispatched first.
+
+    >>> leases = ChunkLeases(num_chunks=3, lease_timeout=10.0, done={2})
+    >>> leases.lease("a", now=0.0), leases.lease("b", now=1.0), leases.lease("c", now=2.0)
+    (0, 1, None)
+    >>> leases.reclaim_expired(now=10.5)
+    [0]
+    >>> leases.lease("c", now=11.0)
+    0
+    >>> leases.complete(1), leases.complete(1), leases.finished
+    (True, False, False)
+    >>> leases.release_owner("c")
+    [0]
+    >>> leases.lease("b", now=12.0), leases.complete(0), leases.finished
+    (0, True, True)
+    """
+
+    def __init__(self, num_chunks: int, lease_timeout: float, done: Iterable[int] = ()):
+        self.lease_timeout = lease_timeout
+        self.done: Set[int] = set(done)
+        self.pending = deque(c for c in range(num_chunks) if c not in self.done)
+        self.leased: Dict[int, Tuple[float, object]] = {}
+        self.num_chunks = num_chunks
+
+    @property
+    def finished(self) -> bool:
+        return len(self.done) == self.num_chunks
+
+    def lease(self, owner, now: float) -> Optional[int]:
+        if not self.pending:
+            return None
+        chunk = self.pending.popleft()
+        self.leased[chunk] = (now + self.lease_timeout, owner)
+        return chunk
+
+    def _requeue(self, chunks: List[int]) -> List[int]:
+        for chunk in chunks:
+            del self.leased[chunk]
+        self.pending.extendleft(reversed(chunks))
+        return chunks
+
+    def reclaim_expired(self, now: float) -> List[int]:
+        return self._requeue(sorted(c for c, (deadline, _) in self.leased.items() if deadline <= now))
+
+    def release_owner(self, owner) -> List[int]:
+        return self._requeue(sorted(c for c, (_, o) in self.leased.items() if o == owner))
+
+    def complete(self, chunk: int) -> bool:
+        """Mark a chunk done; False if it was already done (a late duplicate)."""
+        if chunk in self.done:
+            return False
+        self.leased.pop(chunk, None)
+        if chunk in self.pending:
+            self.pending.remove(chunk)
+        self.done.add(chunk)
+        return True
+
+
+def _set_recv_timeout(conn, seconds: float):
+    """
+    Bound blocking reads on a socket Connection (0 blocks indefinitely).
+
+    Connection reads the raw file descriptor, so the timeout is set with
+    SO_RCVTIMEO rather than socket.settimeout; a read that times out
+    raises OSError.
+    """
+    sock = socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        whole = int(seconds)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO,
+                        struct.pack("ll", whole, int((seconds - whole) * 1e6)))
+    finally:
+        sock.close()
+
+
+def _chunk_path(store_dir: str, start: int, stop: int) -> str:
+    return os.path.join(store_dir, f"chunk_{start:06d}_{stop:06d}.npz")
+
+
+def inputs_digest(inputs: Dict[str, np.ndarray]) -> str:
+    """
+    sha256 over every packed input array (name, dtype, shape and bytes).
+
+    This covers the contact network, households and sequence bank rows,
+    which the scalar config alone does not identify.
+
+    >>> a = {"day_positions": np.array([[0, 1]], dtype=np.int16)}
+    >>> b = {"day_positions": np.array([[1, 0]], dtype=np.int16)}
+    >>> inputs_digest(a) == inputs_digest(dict(a)), inputs_digest(a) == inputs_digest(b)
+    (True, False)
+    """
+    h = hashlib.sha256()
+    for key in sorted(inputs):
+        array = np.ascontiguousarray(inputs[key])
+        h.update(f"{key}:{array.dtype.str}:{array.shape};".encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+def prepare_store(
+    store_dir: str,
+    config: Dict[str, object],
+    chunk_size: int,
+    inputs: Dict[str, np.ndarray],
+):
+    """
+    Create a result store directory for one scenario.
+
+    The scenario config, chunk size and a digest of the packed inputs
+    are recorded in scenario.json. An existing store can be reused, so an
+    interrupted sweep resumes where it stopped, but only if it was
+    written for the same scenario, network and sequence bank.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = dict(config, chunk_size=chunk_size, inputs_sha256=inputs_digest(inputs))
+    path = os.path.join(store_dir, "scenario.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != manifest:
+                raise ValueError(f"result store {store_dir} holds a different scenario")
+        return
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def write_chunk(store_dir: str, start: int, stop: int, history_I: np.ndarray, final_R: np.ndarray):
+    """Write one chunk's results atomically, so readers never see a partial file."""
+    path = _chunk_path(store_dir, start, stop)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, history_I=history_I, final_R=final_R)
+    os.replace(tmp, path)
+
+
+def stored_chunks(store_dir: str, chunks: List[Tuple[int, int]]) -> Set[int]:
+    return {c for c, (start, stop) in enumerate(chunks)
+            if os.path.exists(_chunk_path(store_dir, start, stop))}
+
+
+def load_results(
+    store_dir: str,
+    chunks: List[Tuple[int, int]],
+    num_days: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Assemble history_I and final_R for every chunk in the store."""
+    num_runs = chunks[-1][1] if chunks else 0
+    history_I = np.zeros((num_runs, num_days), dtype=np.int32)
+    final_R = np.zeros(num_runs, dtype=np.int32)
+    for start, stop in chunks:
+        with np.load(_chunk_path(store_dir, start, stop)) as data:
+            history_I[start:stop] = data["history_I"]
+            final_R[start:stop] = data["final_R"]
+    return history_I, final_R
+
+
+class WorkQueueCoordinator:
+    """
+    Serve a scenario's replicate chunks to workers over TCP.
+
+    Workers must present authkey. The handshake runs in each
+    connection's own thread and is abandoned after handshake_timeout
+    seconds, so a peer that connects and stalls cannot keep other
+    workers out. Each connection then receives the packed scenario and
+    repeatedly leases a chunk and returns its results, which go straight
+    to the result store. Leases expire after lease_timeout seconds, and
+    chunks held by a worker whose connection drops are re-queued at once.
+
+    A worker that leases a chunk and hangs, one that leases a chunk and
+    disconnects, and a bare socket that never finishes the handshake do
+    not stop a healthy worker from completing every chunk:
+
+    >>> import tempfile, threading
+    >>> from src.helpers import build_sequence_bank
+    >>> from src.ensemble import run_ensemble
+    >>> edges = {0: [(0, 1), (1, 2)], 1: [(2, 3)]}
+    >>> bank = build_sequence_bank(edges, num_runs=6, num_days=5, seed=1)
+    >>> inputs, config = pack_scenario(edges, bank, 6, num_days=5, infection_prob=0.5)
+    >>> chunks, store = _chunk_bounds(6, 2), tempfile.mkdtemp()
+    >>> coordinator = WorkQueueCoordinator(inputs, config, chunks, store, b"key",
+    ...                                    lease_timeout=1.0, poll_interval=0.1)
+    >>> server = threading.Thread(target=coordinator.serve)
+    >>> server.start()
+    >>> stalled = socket.create_connection(coordinator.address)
+    >>> hung = Client(coordinator.address, authkey=b"key")
+    >>> _ = hung.recv()
+    >>> hung.send(("lease",))
+    >>> hung.recv()[0]
+    'chunk'
+    >>> dropped = Client(coordinator.address, authkey=b"key")
+    >>> _ = dropped.recv()
+    >>> dropped.send(("lease",))
+    >>> dropped.recv()[0]
+    'chunk'
+    >>> dropped.close()
+    >>> run_worker(coordinator.address, b"key")
+    3
+    >>> server.join()
+    >>> hung.close(); stalled.close()
+    >>> hist, final = load_results(store, chunks, num_days=5)
+    >>> ref_hist, ref_final = run_ensemble(edges, bank, 6, num_days=5, infection_prob=0.5)
+    >>> bool((hist == ref_hist).all() and (final == ref_final).all())
+    True
+    """
+
+    def __init__(
+        self,
+        inputs: Dict[str, np.ndarray],
+        config: Dict[str, object],
+        chunks: List[Tuple[int, int]],
+        store_dir: str,
+        authkey: bytes,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        lease_timeout: float = 300.0,
+        poll_interval: float = 0.5,
+        handshake_timeout: float = 10.0,
+    ):
+        # Listener skips the HMAC challenge for an empty key, and workers
+        # exchange pickles, so an unauthenticated queue would run any code
+        if not authkey:
+            raise ValueError("a non-empty authkey is required")
+        self.inputs = inputs
+        self.config = config
+        self.chunks = chunks
+        self.store_dir = store_dir
+        self.authkey = authkey
+        self.poll_interval = poll_interval
+        self.handshake_timeout = handshake_timeout
+
+        self._leases = ChunkLeases(len(chunks), lease_timeout, stored_chunks(store_dir, chunks))
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._closing = False
+        self._accept_thread: Optional[threading.Thread] = None
+        # No authkey here: Listener.accept would run the handshake in the
+        # accept thread, so _handle runs it per connection instead
+        self._listener = Listener(address)
+        # Resolved (host, port); kept after the listener closes
+        self.address: Tuple[str, int] = self._listener.address
+
+    def _accept_loop(self):
+        while not self._closing:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closing:
+                    return
+                continue
+            if self._closing:
+                conn.close()
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            _set_recv_timeout(conn, self.handshake_timeout)
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            # Workers may take a long time over a chunk; lease expiry
+            # covers hung workers from here on
+            _set_recv_timeout(conn, 0)
+        except (AuthenticationError, EOFError, OSError):
+            conn.close()  # wrong authkey, or a stalled or dropped peer
+            return
+
+        owner = object()
+        try:
+            conn.send(("scenario", self.inputs, self.config))
+            while True:
+                msg = conn.recv()
+                if msg[0] == "lease":
+                    with self._lock:
+                        self._leases.reclaim_expired(time.monotonic())
+                        chunk = self._leases.lease(owner, time.monotonic())
+                        finished = self._leases.finished
+                    if chunk is not None:
+                        start, stop = self.chunks[chunk]
+                        conn.send(("chunk", chunk, start, stop))
+                    elif finished:
+                        conn.send(("done",))
+                    else:
+                        conn.send(("wait", self.poll_interval))
+                elif msg[0] == "result":
+                    _, chunk, history_I, final_R = msg
+                    start, stop = self.chunks[chunk]
+                    with self._lock:
+                        fresh = chunk not in self._leases.done
+                    if fresh:
+                        write_chunk(self.store_dir, start, stop, history_I, final_R)
+                    with self._lock:
+                        self._leases.complete(chunk)
+                        if self._leases.finished:
+                            self._finished.set()
+                    conn.send(("ok",))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._leases.release_owner(owner)
+            conn.close()
+
+    def serve(self):
+        """Hand out chunks until every chunk is in the result store."""
+        with self._lock:
+            finished = self._leases.finished
+        if not finished:
+            self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+            self._accept_thread.start()
+            self._finished.wait()
+        self.close()
+
+    def close(self):
+        self._closing = True
+        if self._accept_thread is not None and self._accept_thread.is_alive():
+            # Wake the accept loop with a bare connection; the loop sees
+            # _closing and drops it
+            try:
+                socket.create_connection(self.address, timeout=1.0).close()
+            except OSError:
+                pass
+            self._accept_thread.join(timeout=5.0)
+        self._listener.close()
+
+
+def run_worker(address: Tuple[str, int], authkey: bytes) -> int:
+    """
+    Connect to a coordinator and simulate chunks until it says done.
+
+    A coordinator that has already shut down (connection refused or
+    closed) also counts as done, since it only stops once every chunk is
+    stored.
+
+    :return num_chunks : Number of chunks this worker completed
+    """
+    completed = 0
+    try:
+        conn = Client(address, authkey=authkey)
+    except (ConnectionError, EOFError):
+        return completed
+
+    with conn:
+        try:
+            _, inputs, config = conn.recv()
+            num_days = config["num_days"]
+            while True:
+                conn.send(("lease",))
+                msg = conn.recv()
+                if msg[0] == "done":
+                    return completed
+                if msg[0] == "wait":
+                    time.sleep(msg[1])
+                    continue
+
+                _, chunk, start, stop = msg
+                history_I = np.zeros((stop - start, num_days), dtype=np.int32)
+                final_R = np.zeros(stop - start, dtype=np.int32)
+                simulate_runs(inputs, config, start, stop, history_I, final_R)
+                conn.send(("result", chunk, history_I, final_R))
+                conn.recv()
+                completed += 1
+        except (EOFError, OSError):
+            return completed
+
+
+def run_workqueue(
+    daily_edges: Dict[int, List[Tuple[int, int]]],
+    sequence_bank: np.ndarray,
+    num_runs: int,
+    store_dir: str,
+    num_days: int = 120,
+    infection_prob: float = 0.03,
+    infectious_days: int = 5,
+    external_infection_prob: float = 0.001,
+    initial_infected: int = 3,
+    isolate_symptomatic: bool = False,
+    isolate_households: bool = False,
+    vaccination_coverage: float = 0.0,
+    contact_reduction: float = 1.0,
+    household_size: int = 4,
+    seed: int = 0,
+    chunk_size: int = 10,
+    local_workers: int = 0,
+    address: Tuple[str, int] = ("127.0.0.1", 0),
+    authkey: Optional[bytes] = None,
+    lease_timeout: float = 300.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run one scenario's replicates through a TCP work queue.
+
+    The calling process coordinates and needs no external broker. It
+    splits the replicates into chunks of chunk_size and leases them to
+    any worker that connects. Finished chunks are written to store_dir
+    as they arrive. Other nodes join with
+
+        WORKQUEUE_AUTHKEY=... python -m src.workqueue worker HOST PORT
+
+    local_workers starts that many worker processes on this machine,
+    which is also how the backend is exercised on a single box.
+    Replicate r uses the same bank row and seed as in run_ensemble, so
+    both backends return identical results.
+
+    :param store_dir : Result store directory for this scenario. Chunks
+        already stored are not recomputed.
+    :param address : (host, port) to listen on. Port 0 picks a free port.
+    :param authkey : Shared secret for workers. Defaults to $WORKQUEUE_AUTHKEY,
+        or to a random key, which only suits local workers.
+    :param lease_timeout : Seconds before an unanswered chunk is re-dispatched
+
+    :return history_I : int32 array (num_runs, num_days) of daily infectious counts
+    :return final_R : int32 array (num_runs,) of final recovered counts
+
+    >>> import tempfile
+    >>> from src.helpers import build_sequence_bank
+    >>> from src.ensemble import run_ensemble
+    >>> edges = {0: [(0, 1), (1, 2)], 1: [(2, 3)]}
+    >>> bank = build_sequence_bank(edges, num_runs=6, num_days=5, seed=1)
+    >>> hist, final = run_workqueue(edges, bank, 6, tempfile.mkdtemp(), num_days=5,
+    ...                             infection_prob=0.5, chunk_size=2, local_workers=2)
+    >>> ref_hist, ref_final = run_ensemble(edges, bank, 6, num_days=5, infection_prob=0.5)
+    >>> bool((hist == ref_hist).all() and (final == ref_final).all())
+    True
+
+    Re-running on a finished store reads it back without serving, and a
+    store is never reused for a different sequence bank:
+
+    >>> store = tempfile.mkdtemp()
+    >>> first = run_workqueue(edges, bank, 6, store, num_days=5, infection_prob=0.5,
+    ...                       chunk_size=2, local_workers=1)
+    >>> again = run_workqueue(edges, bank, 6, store, num_days=5, infection_prob=0.5,
+    ...                       chunk_size=2, local_workers=1)
+    >>> bool((first[0] == again[0]).all())
+    True
+    >>> other_bank = build_sequence_bank(edges, num_runs=6, num_days=5, seed=99)
+    >>> run_workqueue(edges, other_bank, 6, store, num_days=5, infection_prob=0.5,
+    ...               chunk_size=2)  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    ValueError: result store ... holds a different scenario
+    """
+    if authkey is None:
+        env_key = os.environ.get(AUTHKEY_ENV)
+        authkey = env_key.encode() if env_key else os.urandom(16)
+
+    inputs, config = pack_scenario(
+        daily_edges,
+        sequence_bank,
+        num_runs,
+        num_days=num_days,
+        infection_prob=infection_prob,
+        infectious_days=infectious_days,
+        external_infection_prob=external_infection_prob,
+        initial_infected=initial_infected,
+        isolate_symptomatic=isolate_symptomatic,
+        isolate_households=isolate_households,
+        vaccination_coverage=vaccination_coverage,
+        contact_reduction=contact_reduction,
+        household_size=household_size,
+        seed=seed,
+    )
+    chunks = _chunk_bounds(num_runs, chunk_size)
+    prepare_store(store_dir, config, chunk_size, inputs)
+
+    coordinator = WorkQueueCoordinator(
+        inputs, config, chunks, store_dir, authkey,
+        address=address, lease_timeout=lease_timeout,
+    )
+    if len(stored_chunks(store_dir, chunks)) == len(chunks):
+        local_workers = 0  # nothing left to compute
+    workers = [
+        Process(target=run_worker, args=(coordinator.address, authkey), daemon=True)
+        for _ in range(local_workers)
+    ]
+    for w in workers:
+        w.start()
+    try:
+        coordinator.serve()
+    finally:
+        # Every chunk is stored (or serving failed): local workers are done
+        for w in workers:
+            w.join(timeout=1.0)
+            if w.is_alive():
+                w.terminate()
+                w.join()
+
+    return load_results(store_dir, chunks, num_days)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo work-queue worker")
+    parser.add_argument("role", choices=["worker"])
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    args = parser.parse_args()
+
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        parser.error(f"set {AUTHKEY_ENV} to the coordinator's authkey")
+    done = run_worker((args.host, args.port), key.encode())
+    print(f"Worker finished {done} chunks")